@@ -1,12 +1,23 @@
+import asyncio
 import json
 import math
 import os
+import random
+import sqlite3
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
@@ -75,14 +86,99 @@ class TypeTranslator:
     
     @classmethod
     def translate_types(cls, types: List[str]) -> str:
-        return ", ".join([cls.TRANSLATIONS.get(t, t) for t in types])
+        return _translate_types_cached(tuple(types))
+
+
+@lru_cache(maxsize=2048)
+def _translate_types_cached(types: Tuple[str, ...]) -> str:
+    # Los mismos conjuntos de tipos se repiten en casi todos los negocios,
+    # así que la traducción completa se memoriza por tupla.
+    translations = TypeTranslator.TRANSLATIONS
+    return ", ".join(translations.get(t, t) for t in types)
+
+
+REQUEST_TIMEOUT: Tuple[float, int] = (3.05, 10)
+
+def _write_bytes_atomic(path: Path, payload: bytes) -> None:
+    """Escribe en un temporal y renombra para no dejar JSON a medias."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, path)
+
+
+_FILENAME_TABLE = str.maketrans({
+    " ": "_",
+    "ñ": "n",
+    "á": "a",
+    "é": "e",
+    "í": "i",
+    "ó": "o",
+    "ú": "u"
+})
 
 
 class GoogleGeocodingService:
-    
-    def __init__(self, api_key: str) -> None:
+
+    CACHE_PATH = "./data/geocache.sqlite3"
+
+    def __init__(self, api_key: str, session: requests.Session) -> None:
         self.api_key = api_key
         self.base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self._http = session
+        self._memory_cache: Dict[str, Coordinates] = {}
+        self._db_lock = threading.Lock()
+        self._db = self._open_cache()
+
+
+    def _open_cache(self) -> sqlite3.Connection:
+        """Abre (o crea) la caché persistente de geocodificación."""
+        os.makedirs(os.path.dirname(self.CACHE_PATH), exist_ok=True)
+        db = sqlite3.connect(self.CACHE_PATH, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS geocache ("
+            "name TEXT PRIMARY KEY, lat REAL, lng REAL, "
+            "addr TEXT, prec TEXT, ts INTEGER)"
+        )
+        db.commit()
+        return db
+
+
+    def _cache_get(self, polygon_name: str) -> Optional[Coordinates]:
+        cached = self._memory_cache.get(polygon_name)
+        if cached is not None:
+            return cached
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT lat, lng, addr, prec FROM geocache WHERE name = ?",
+                (polygon_name,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        coordinates = Coordinates(
+            lat=row[0], lng=row[1], formatted_address=row[2], precision=row[3]
+        )
+        self._memory_cache[polygon_name] = coordinates
+        return coordinates
+
+
+    def _cache_set(self, polygon_name: str, coordinates: Coordinates) -> None:
+        self._memory_cache[polygon_name] = coordinates
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    polygon_name,
+                    coordinates.lat,
+                    coordinates.lng,
+                    coordinates.formatted_address,
+                    coordinates.precision,
+                    int(time.time())
+                )
+            )
+            self._db.commit()
     
 
     def _generate_search_variations(self, polygon_name: str) -> List[str]:
@@ -110,7 +206,15 @@ class GoogleGeocodingService:
             Coordinates object o None si no se encuentran
         """
         rprint(f"[bold blue]Buscando para:[/bold blue] {polygon_name}")
-        
+
+        cached = self._cache_get(polygon_name)
+        if cached is not None:
+            rprint(
+                f"[green]Coordenadas en caché:[/green] "
+                f"lat={cached.lat}, lng={cached.lng}"
+            )
+            return cached
+
         search_variations = self._generate_search_variations(polygon_name)
         
         for variation in search_variations:
@@ -123,7 +227,9 @@ class GoogleGeocodingService:
                         "components": "country:ES|administrative_area:Madrid"
                     }
                     
-                    response = requests.get(self.base_url, params=params)
+                    response = self._http.get(
+                        self.base_url, params=params, timeout=REQUEST_TIMEOUT
+                    )
                     response.raise_for_status()
                     data = response.json()
                     
@@ -143,25 +249,29 @@ class GoogleGeocodingService:
                             f"lat={coordinates.lat}, lng={coordinates.lng}"
                         )
                         rprint(f"[dim]Dirección: {coordinates.formatted_address}[/dim]")
-                        
+
+                        self._cache_set(polygon_name, coordinates)
                         return coordinates
                     
                     elif data.get("status") == "ZERO_RESULTS":
+                        # Resultado determinista: reintentar no cambia nada.
                         rprint(f"[yellow]Sin resultados para:[/yellow] {variation}")
-                        continue
-                        
+                        break
+
                     elif data.get("status") == "OVER_QUERY_LIMIT":
                         rprint("[red]Límite de consultas excedido. Esperando...[/red]")
-                        time.sleep(5)
+                        retry_after = response.headers.get("Retry-After")
+                        time.sleep(float(retry_after) if retry_after else 5)
                         continue
-                        
+
                     else:
                         rprint(f"[red]Error en geocoding:[/red] {data.get('status')}")
-                        
+
                 except requests.RequestException as e:
                     rprint(f"[red]Error en intento {attempt + 1}:[/red] {str(e)}")
                     if attempt < max_retries - 1:
-                        time.sleep(2)
+                        backoff = min(8, 0.5 * 2 ** attempt)
+                        time.sleep(backoff + random.random() * 0.25)
         
         rprint(f"[red]No se pudieron obtener coordenadas para:[/red] {polygon_name}")
         return None
@@ -169,13 +279,66 @@ class GoogleGeocodingService:
 
 class GooglePlacesService:
     
-    def __init__(self, api_key: str) -> None:
+    CACHE_PATH = "./data/details_cache.sqlite3"
+    CACHE_TTL_SECONDS = 7 * 86400
+    MAX_PAGES = 3
+
+    def __init__(self, api_key: str, session: requests.Session) -> None:
         self.api_key = api_key
         self.places_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
         self.details_url = "https://maps.googleapis.com/maps/api/place/details/json"
+        self._http = session
+        self._memory_cache: Dict[str, Dict[str, Optional[str]]] = {}
+        self._db_lock = threading.Lock()
+        self._db = self._open_cache()
+
+
+    def _open_cache(self) -> sqlite3.Connection:
+        """Abre (o crea) la caché persistente de detalles de lugares."""
+        os.makedirs(os.path.dirname(self.CACHE_PATH), exist_ok=True)
+        db = sqlite3.connect(self.CACHE_PATH, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS place_details ("
+            "place_id TEXT PRIMARY KEY, payload TEXT, ts INTEGER)"
+        )
+        db.commit()
+        return db
+
+
+    def _cache_get(self, place_id: str) -> Optional[Dict[str, Optional[str]]]:
+        cached = self._memory_cache.get(place_id)
+        if cached is not None:
+            return cached
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT payload, ts FROM place_details WHERE place_id = ?",
+                (place_id,)
+            ).fetchone()
+
+        if row is None or time.time() - row[1] > self.CACHE_TTL_SECONDS:
+            return None
+
+        details = json.loads(row[0])
+        self._memory_cache[place_id] = details
+        return details
+
+
+    def _cache_set(self, place_id: str, details: Dict[str, Optional[str]]) -> None:
+        self._memory_cache[place_id] = details
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO place_details VALUES (?, ?, ?)",
+                (place_id, json.dumps(details, ensure_ascii=False), int(time.time()))
+            )
+            self._db.commit()
     
 
     def get_place_details(self, place_id: str) -> Dict[str, Optional[str]]:
+        cached = self._cache_get(place_id)
+        if cached is not None:
+            return cached
+
         params = {
             "place_id": place_id,
             "fields": "formatted_phone_number,website",
@@ -183,90 +346,205 @@ class GooglePlacesService:
         }
         
         try:
-            response = requests.get(self.details_url, params=params)
+            response = self._http.get(
+                self.details_url, params=params, timeout=REQUEST_TIMEOUT
+            )
             response.raise_for_status()
             result = response.json()
             
             if result.get("status") == "OK":
-                return result.get("result", {})
+                details = result.get("result", {})
+                self._cache_set(place_id, details)
+                return details
         except requests.RequestException:
             pass
-        
+
+        return {}
+
+
+    async def _aget_place_details(
+        self,
+        client: httpx.AsyncClient,
+        place_id: str
+    ) -> Dict[str, Optional[str]]:
+        cached = self._cache_get(place_id)
+        if cached is not None:
+            return cached
+
+        params = {
+            "place_id": place_id,
+            "fields": "formatted_phone_number,website",
+            "key": self.api_key
+        }
+
+        try:
+            response = await client.get(self.details_url, params=params)
+            response.raise_for_status()
+            result = response.json()
+
+            if result.get("status") == "OK":
+                details = result.get("result", {})
+                self._cache_set(place_id, details)
+                return details
+        except httpx.HTTPError:
+            pass
+
         return {}
+
+
+    async def _fetch_details_async(
+        self,
+        place_ids: List[str]
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        async with httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=10.0
+        ) as client:
+            details = await asyncio.gather(
+                *[self._aget_place_details(client, pid) for pid in place_ids]
+            )
+        return dict(zip(place_ids, details))
+
+
+    def fetch_details(
+        self,
+        place_ids: List[str]
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        """Resuelve los detalles de varios lugares en una sola ráfaga async."""
+        if not place_ids:
+            return {}
+        return asyncio.run(self._fetch_details_async(place_ids))
     
 
-    def search_nearby_businesses(
-        self, 
-        coordinates: Coordinates, 
+    def iter_nearby_pages(
+        self,
+        coordinates: Coordinates,
         radius: int = 320
-    ) -> List[Dict]:
+    ):
         """
-        Busca negocios en un radio alrededor de las coordenadas
-        
+        Genera las páginas de Nearby Search según van llegando
+
+        Permite al llamador solapar trabajo útil (p. ej. peticiones de
+        detalles) con la espera de activación del next_page_token.
+
         Args:
             coordinates: Coordenadas del centro de búsqueda
             radius: Radio de búsqueda en metros
-            
-        Returns:
-            Lista de negocios encontrados
+
+        Yields:
+            Lista de negocios de cada página
         """
-        all_businesses = {}
-        
         params = {
             "location": f"{coordinates.lat},{coordinates.lng}",
             "radius": radius,
             "key": self.api_key
         }
-        
-        while True:
+
+        # Nearby Search devuelve como máximo 3 páginas (60 resultados).
+        for page_idx in range(self.MAX_PAGES):
             try:
-                response = requests.get(self.places_url, params=params)
+                response = self._http.get(
+                    self.places_url, params=params, timeout=REQUEST_TIMEOUT
+                )
                 response.raise_for_status()
                 data = response.json()
-                
+
                 if data.get("status") != "OK":
                     rprint(f"[red]Error en búsqueda:[/red] {data.get('status')}")
                     break
-                
-                for place in data.get("results", []):
-                    place_id = place.get("place_id")
-                    if place_id not in all_businesses:
-                        all_businesses[place_id] = place
-                
-                if "next_page_token" in data:
-                    params["pagetoken"] = data["next_page_token"]
-                    rprint("[dim]Cargando más resultados...[/dim]")
-                    time.sleep(3)
-                else:
+
+                yield data.get("results", [])
+
+                if "next_page_token" not in data or page_idx == self.MAX_PAGES - 1:
                     break
-                    
+
+                params["pagetoken"] = data["next_page_token"]
+                rprint("[dim]Cargando más resultados...[/dim]")
+                time.sleep(3)
+
             except requests.RequestException as e:
                 rprint(f"[red]Error en búsqueda de lugares:[/red] {str(e)}")
                 break
-        
+
+
+    def search_nearby_businesses(
+        self,
+        coordinates: Coordinates,
+        radius: int = 320
+    ) -> List[Dict]:
+        """
+        Busca negocios en un radio alrededor de las coordenadas
+
+        Args:
+            coordinates: Coordenadas del centro de búsqueda
+            radius: Radio de búsqueda en metros
+
+        Returns:
+            Lista de negocios encontrados
+        """
+        all_businesses = {}
+
+        for page in self.iter_nearby_pages(coordinates, radius):
+            for place in page:
+                place_id = place.get("place_id")
+                if place_id not in all_businesses:
+                    all_businesses[place_id] = place
+
         return list(all_businesses.values())
 
 
 class PolygonBusinessScraper:
 
     def __init__(self, api_key: str) -> None:
-        
+
         self.api_key = api_key
-        self.geocoding_service = GoogleGeocodingService(api_key)
-        self.places_service = GooglePlacesService(api_key)
+        self.session = self._create_session()
+        self.geocoding_service = GoogleGeocodingService(api_key, self.session)
+        self.places_service = GooglePlacesService(api_key, self.session)
         self.type_translator = TypeTranslator()
-    
+
+
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """Crea una sesión compartida con pool de conexiones keep-alive."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+        session.mount("https://", adapter)
+        return session
+
+
+    def close(self) -> None:
+        """Cierra la sesión HTTP compartida."""
+        self.session.close()
+
+
+    def __enter__(self) -> "PolygonBusinessScraper":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
 
     def _create_business_details(
-        self, 
-        place: Dict, 
-        coordinates: Coordinates, 
-        polygon_name: str
+        self,
+        place: Dict,
+        coordinates: Coordinates,
+        polygon_name: str,
+        details: Dict[str, Optional[str]]
     ) -> BusinessDetails:
-        
+
         place_id = place.get("place_id")
-        details = self.places_service.get_place_details(place_id)
-        
+
         return BusinessDetails(
             nombre=place.get("name", ""),
             direccion=place.get("vicinity"),
@@ -311,14 +589,27 @@ class PolygonBusinessScraper:
             f"alrededor de: {coordinates.lat}, {coordinates.lng}[/blue]"
         )
         
-        places = self.places_service.search_nearby_businesses(
+        places_by_id: Dict[str, Dict] = {}
+        for page in self.places_service.iter_nearby_pages(
             coordinates, search_radius
-        )
+        ):
+            for place in page:
+                place_id = place.get("place_id")
+                if place_id and place_id not in places_by_id:
+                    places_by_id[place_id] = place
+
+        details_by_id = self.places_service.fetch_details(list(places_by_id))
+        places = list(places_by_id.values())
 
         businesses = []
         for place in places:
-            business = self._create_business_details(place, coordinates, polygon_name)
-            businesses.append(business.__dict__)
+            business = self._create_business_details(
+                place,
+                coordinates,
+                polygon_name,
+                details_by_id.get(place.get("place_id"), {})
+            )
+            businesses.append(asdict(business))
         
         filename = self._generate_filename(polygon_name)
         self._save_businesses_to_file(businesses, filename)
@@ -330,14 +621,7 @@ class PolygonBusinessScraper:
     
     def _generate_filename(self, polygon_name: str) -> str:
 
-        safe_name = (polygon_name.lower()
-                    .replace(' ', '_')
-                    .replace('ñ', 'n')
-                    .replace('á', 'a')
-                    .replace('é', 'e')
-                    .replace('í', 'i')
-                    .replace('ó', 'o')
-                    .replace('ú', 'u'))
+        safe_name = polygon_name.lower().translate(_FILENAME_TABLE)
         return f"negocios_{safe_name}.json"
     
 
@@ -348,16 +632,57 @@ class PolygonBusinessScraper:
     ) -> None:
 
         os.makedirs("./data", exist_ok=True)
-        filepath = f"./data/{filename}"
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(businesses, f, ensure_ascii=False, indent=2)
+        _write_bytes_atomic(
+            Path("./data") / filename,
+            orjson.dumps(businesses, option=orjson.OPT_INDENT_2)
+        )
+
+
+class TokenBucket:
+    """Limitador de caudal tipo token bucket compartido entre hilos."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Bloquea hasta que haya tokens disponibles."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
 
 
 class BatchProcessor:
-    
-    def __init__(self, scraper: PolygonBusinessScraper) -> None:
+
+    def __init__(
+        self,
+        scraper: PolygonBusinessScraper,
+        max_workers: int = 8,
+        polygons_per_second: float = 4.0
+    ) -> None:
         self.scraper = scraper
-    
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(
+            rate=polygons_per_second,
+            capacity=polygons_per_second
+        )
+
 
     def process_polygon_list(
         self, 
@@ -380,51 +705,41 @@ class BatchProcessor:
         )
         
         results = []
-        
+        checkpoint_path = Path(output_file).with_suffix(".jsonl")
+        os.makedirs("./data", exist_ok=True)
+
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             console=console,
-        ) as progress:
-            
+        ) as progress, open(checkpoint_path, "ab") as checkpoint:
+
             task = progress.add_task(
-                "Procesando polígonos...", 
+                "Procesando polígonos...",
                 total=len(polygon_names)
             )
-            
-            for i, polygon_name in enumerate(polygon_names, 1):
-                progress.update(
-                    task, 
-                    description=f"Procesando {i}/{len(polygon_names)}: {polygon_name}"
-                )
-                
-                try:
-                    business_count = self.scraper.scan_polygon(polygon_name)
-                    result = ScanResult(
-                        poligono=polygon_name,
-                        negocios_encontrados=business_count or 0,
-                        estado="completado" if business_count is not None else "fallido",
-                        timestamp=time.strftime("%Y-%m-%d %H:%M:%S")
-                    )
-                except Exception as e:
-                    rprint(f"[red]Error procesando {polygon_name}: {str(e)}[/red]")
-                    result = ScanResult(
-                        poligono=polygon_name,
-                        negocios_encontrados=0,
-                        estado="error",
-                        timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
-                        error=str(e)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(self._scan_one, name): name
+                    for name in polygon_names
+                }
+
+                for i, future in enumerate(as_completed(futures), 1):
+                    polygon_name = futures[future]
+                    result = future.result()
+                    results.append(result)
+
+                    checkpoint.write(orjson.dumps(asdict(result)) + b"\n")
+
+                    progress.update(
+                        task,
+                        description=(
+                            f"Procesado {i}/{len(polygon_names)}: {polygon_name}"
+                        )
                     )
-                
-                results.append(result)
-                
-                if i % 10 == 0:
-                    self._save_summary(results, output_file)
-                    rprint(f"[dim]Progreso guardado: {i}/{len(polygon_names)}[/dim]")
-
-                time.sleep(1)
-                progress.advance(task)
-        
+                    progress.advance(task)
+
 
         self._save_summary(results, output_file)
         self._display_summary_table(results)
@@ -434,14 +749,38 @@ class BatchProcessor:
             f"Resumen guardado en {output_file}[/bold green]"
         )
         return results
-    
+
+
+    def _scan_one(self, polygon_name: str) -> ScanResult:
+        """Escanea un polígono y construye su ScanResult (seguro entre hilos)."""
+        self.rate_limiter.acquire()
+        try:
+            business_count = self.scraper.scan_polygon(polygon_name)
+            return ScanResult(
+                poligono=polygon_name,
+                negocios_encontrados=business_count or 0,
+                estado="completado" if business_count is not None else "fallido",
+                timestamp=datetime.now().isoformat(timespec="seconds")
+            )
+        except Exception as e:
+            rprint(f"[red]Error procesando {polygon_name}: {str(e)}[/red]")
+            return ScanResult(
+                poligono=polygon_name,
+                negocios_encontrados=0,
+                estado="error",
+                timestamp=datetime.now().isoformat(timespec="seconds"),
+                error=str(e)
+            )
+
 
     def _save_summary(self, results: List[ScanResult], filename: str) -> None:
         """Guarda resumen de resultados."""
         os.makedirs("./data", exist_ok=True)
-        results_dict = [result.__dict__ for result in results]
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results_dict, f, ensure_ascii=False, indent=2)
+        results_dict = [asdict(result) for result in results]
+        _write_bytes_atomic(
+            Path(filename),
+            orjson.dumps(results_dict, option=orjson.OPT_INDENT_2)
+        )
     
     
     def _display_summary_table(self, results: List[ScanResult]) -> None:
@@ -542,16 +881,17 @@ def main():
     
     try:
         app = ScraperApp()
-        
-        if args.test:
-            app.run_test_mode()
-        elif args.poligon:
-            app.scan_single_polygon(args.poligon)
-        elif args.file:
-            app.process_polygon_file(args.file)
-        else:
-            app.show_usage()
-            
+
+        with app.scraper:
+            if args.test:
+                app.run_test_mode()
+            elif args.poligon:
+                app.scan_single_polygon(args.poligon)
+            elif args.file:
+                app.process_polygon_file(args.file)
+            else:
+                app.show_usage()
+
     except GoogleAPIError as e:
         rprint(f"[red]Error de API: {e}[/red]")
     except Exception as e:
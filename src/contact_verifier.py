@@ -0,0 +1,537 @@
+import asyncio
+import re
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import httpx
+import orjson
+from playwright.async_api import async_playwright
+
+try:
+    # RE2 garantiza tiempo lineal sobre documentos grandes; el motor de
+    # serie hace backtracking y puede degenerar con HTML patológico.
+    import re2 as _contact_regex_engine
+except ImportError:
+    _contact_regex_engine = re
+from rich.console import Console
+
+console = Console()
+
+_PHONE_CLEAN_RE = re.compile(r"[\s\-\(\)\.]")
+
+# A nivel de módulo para que email_scraper reutilice el mismo filtro: los
+# regex sobre HTML crudo también cazan nombres de assets tipo logo@2x.png.
+INVALID_EMAIL_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".bmp",
+    ".tiff", ".avif", ".heic", ".jfif", ".css", ".js", ".min.js",
+    ".min.css", ".map", ".woff", ".woff2", ".ttf", ".eot", ".otf",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip",
+    ".rar", ".7z", ".gz", ".tar", ".mp3", ".mp4", ".avi", ".mov",
+    ".webm", ".wav", ".html", ".htm", ".php", ".asp", ".aspx", ".jsp",
+    ".json", ".xml", ".csv", ".txt", ".exe", ".dmg", ".apk", ".wasm"
+}
+# Una sola pasada en C: endswith acepta una tupla de sufijos.
+INVALID_EMAIL_EXTENSIONS_TUPLE = tuple(INVALID_EMAIL_EXTENSIONS)
+
+# Solo el texto visible más los enlaces mailto:/tel: — justo las dos clases
+# de cadenas que los regex necesitan, en una fracción del HTML completo.
+_PAGE_TEXT_JS = """
+() => document.documentElement.innerText + '\\n' +
+    Array.from(document.querySelectorAll('a[href^="mailto:"],a[href^="tel:"]'))
+        .map(a => a.href)
+        .join('\\n')
+"""
+
+
+class ConcurrentContactVerifier:
+
+    def __init__(self, max_concurrent_workers=10):
+        self.root = Path(__file__).parent
+        self.data_dir = self.root / '../data'
+        self.output_dir = self.root / '../output'
+        self.output_dir.mkdir(exist_ok=True)
+
+        self.max_concurrent_workers = max_concurrent_workers
+        self.semaphore = None
+
+        self.playwright = None
+        self.browser = None
+        self.context_pool = None
+        self.contexts = []
+        self.http_client = None
+
+        # /contacto primero: es donde suelen estar los emails en sitios
+        # españoles, y encontrar uno ahí evita rastrear el resto de rutas.
+        self.contact_paths = [
+            "/contacto", "", "/contact", "/empresa", "/about",
+            "/quienes-somos", "/contactar", "/aviso-legal"
+        ]
+
+        # Un único autómata recorre el HTML una sola vez para ambos tipos de
+        # contacto; el grupo que disparó el match decide cómo tratarlo.
+        email_pat = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
+        phone_pat = r"(?:\+34|0034)?[\s\-\.]?[6-9]\d{2}[\s\-\.]?\d{3}[\s\-\.]?\d{3}"
+        self.contact_re = _contact_regex_engine.compile(
+            f"(?P<email>{email_pat})|(?P<phone>{phone_pat})"
+        )
+
+        self.invalid_email_extensions = INVALID_EMAIL_EXTENSIONS
+        self.invalid_email_extensions_tuple = INVALID_EMAIL_EXTENSIONS_TUPLE
+        # Rechazo en O(1): toda extensión tiene al menos 3 caracteres, así que
+        # si los 3 últimos del email no están aquí, ninguna puede coincidir y
+        # el endswith sobre la tupla completa ni se ejecuta.
+        self._ext_tail3 = frozenset(
+            ext[-3:] for ext in self.invalid_email_extensions
+        )
+
+        problematic_patterns = [
+            "sentry", "wixpress", "example", "yourdomain", "tudominio",
+            "domain.com", "email.com", "noreply", "no-reply", "donotreply",
+            "mailer-daemon", "postmaster@", "abuse@", "webmaster@",
+            "localhost", "godaddy", "cloudflare", "jquery", "bootstrap",
+            "googleapis", "gstatic", "fontawesome", "placeholder", "lorem"
+        ]
+        self.problematic_re = re.compile(
+            "|".join(map(re.escape, problematic_patterns))
+        )
+
+        self.blocked_resource_types = frozenset(
+            {"image", "font", "media", "stylesheet"}
+        )
+
+        self.technical_domains = {
+            "sentry.io", "wixpress.com", "google.com", "googleapis.com",
+            "gstatic.com", "schema.org", "w3.org", "jquery.com",
+            "cloudflare.com", "jsdelivr.net", "unpkg.com"
+        }
+        self._technical_suffixes = tuple(
+            "." + domain for domain in self.technical_domains
+        )
+
+        self._suspicious_domains = frozenset(
+            {"example.com", "domain.com", "test.com", "email.com"}
+        )
+        self._hex_local_re = re.compile(r"^[a-f0-9]+$")
+        self._email_shape_re = re.compile(
+            r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z]{2,}$"
+        )
+
+        # Cadenas y franquicias repiten sitio_web, y varias contact_paths
+        # acaban resolviendo a la misma URL canónica: ambos niveles se cachean.
+        self.url_cache = {}
+        self.site_cache = {}
+
+        # Cortesía por host en vez de pausas planas: dos peticiones como
+        # máximo contra el mismo netloc, sin que hosts distintos se esperen.
+        self._host_locks = defaultdict(lambda: asyncio.Semaphore(2))
+
+        self.processed_count = 0
+        self.total_count = 0
+        self.emails_found = 0
+        self.phones_found = 0
+        self.results_by_index = []
+
+
+    async def initialize_browsers(self):
+        # Un único Chromium: los contextos son dos órdenes de magnitud más
+        # baratos que un navegador y dan el mismo aislamiento entre workers.
+        console.print("[cyan][i][/cyan] Iniciando navegador...")
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
+            headless=True,
+            chromium_sandbox=False,
+            args=[
+                "--no-sandbox",
+                "--disable-dev-shm-usage",
+                "--disable-background-timer-throttling",
+                "--disable-backgrounding-occluded-windows",
+                "--disable-renderer-backgrounding",
+                "--disable-extensions",
+                "--disable-default-apps",
+                "--disable-sync",
+                "--metrics-recording-only",
+                "--mute-audio",
+                "--no-first-run",
+                "--no-zygote",
+                "--disk-cache-size=1",
+                "--disable-features=TranslateUI,AudioServiceOutOfProcess,MediaRouter"
+            ]
+        )
+
+        # Crear un contexto es lo más caro después de lanzar el navegador:
+        # se reutiliza uno por worker durante toda la ejecución.
+        self.context_pool = asyncio.Queue()
+        for _ in range(self.max_concurrent_workers):
+            context = await self.browser.new_context(
+                user_agent=(
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                    "AppleWebKit/537.36"
+                ),
+                accept_downloads=False
+            )
+            await context.route("**/*", self._filter_request)
+            self.contexts.append(context)
+            await self.context_pool.put(context)
+
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            timeout=10,
+            headers={"User-Agent": (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            )},
+            follow_redirects=True
+        )
+
+
+    async def _filter_request(self, route):
+        # Solo el HTML interesa para extraer contactos por regex: imágenes,
+        # fuentes, medios, CSS y los hosts de analítica/CDN se abortan.
+        request = route.request
+        if request.resource_type in self.blocked_resource_types:
+            await route.abort()
+            return
+
+        host = request.url.split("/", 3)[2] if "://" in request.url else ""
+        if host in self.technical_domains or host.endswith(self._technical_suffixes):
+            await route.abort()
+            return
+
+        await route.continue_()
+
+
+    async def cleanup_browsers(self):
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+        for context in self.contexts:
+            await context.close()
+        self.contexts = []
+        self.context_pool = None
+
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+    def is_valid_email(self, email):
+        email = email.lower().strip()
+
+        if not email or "@" not in email:
+            return False
+
+        if email[-3:] in self._ext_tail3 and email.endswith(self.invalid_email_extensions_tuple):
+            return False
+
+        if self.problematic_re.search(email):
+            return False
+
+        local, _, domain = email.partition("@")
+
+        if domain in self._suspicious_domains:
+            return False
+
+        # Los hashes largos (trackers, CDNs) se cuelan como parte local.
+        if len(local) > 20 and self._hex_local_re.match(local):
+            return False
+
+        if domain in self.technical_domains or domain.endswith(self._technical_suffixes):
+            return False
+
+        return self._email_shape_re.match(email) is not None
+
+
+    def normalize_phone(self, phone):
+        if not phone:
+            return None
+
+        # Desde el regex fusionado los matches siempre son cadenas completas,
+        # así que ya no hace falta reensamblar tuplas de grupos.
+        cleaned = _PHONE_CLEAN_RE.sub("", phone)
+
+        if cleaned.startswith("0034"):
+            cleaned = "+34" + cleaned[4:]
+        elif cleaned.startswith("34") and len(cleaned) == 11:
+            cleaned = "+" + cleaned
+        elif not cleaned.startswith("+34") and len(cleaned) == 9:
+            cleaned = "+34" + cleaned
+
+        if len(cleaned) != 12 or not cleaned[3:].isdigit():
+            return None
+
+        return cleaned
+
+
+    def _scan_content(self, content, emails, phones):
+        for match in self.contact_re.finditer(content):
+            if match.lastgroup == "email":
+                email = match.group("email").lower()
+                if self.is_valid_email(email) and email not in emails:
+                    emails.append(email)
+            else:
+                normalized = self.normalize_phone(match.group("phone"))
+                if normalized and normalized not in phones:
+                    phones.append(normalized)
+
+
+    async def try_static_extraction(self, website):
+        """
+        Intenta extraer contactos con HTTP plano antes de levantar Chromium.
+
+        La mayoría de páginas de contacto de pymes son HTML estático; solo
+        cuando no aparece ningún email (indicio de sitio renderizado por JS)
+        o el servidor bloquea la petición merece la pena el navegador.
+        """
+        emails = []
+        phones = []
+
+        for path in self.contact_paths:
+            url = urljoin(website, path) if path else website
+            try:
+                res = await self.http_client.get(url)
+            except httpx.HTTPError:
+                return None
+
+            if res.status_code in (403, 503):
+                # Posible Cloudflare/bloqueo de bots: escalar al navegador.
+                return None
+            if res.status_code != 200:
+                continue
+
+            self._scan_content(res.text, emails, phones)
+            if emails:
+                break
+
+        if emails:
+            return emails, phones
+        return None
+
+
+    async def extract_contacts_from_page(self, page, url):
+        canon = urlparse(url)._replace(fragment="").geturl().rstrip("/")
+        cached = self.url_cache.get(canon)
+        if cached is not None:
+            return cached
+
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=10000)
+
+            content = await page.evaluate(_PAGE_TEXT_JS)
+
+            emails = []
+            phones = []
+            self._scan_content(content, emails, phones)
+
+            self.url_cache[canon] = (emails, phones)
+            return emails, phones
+        except Exception:
+            return [], []
+
+
+    async def verify_business_contacts_worker(self, business, index):
+        async with self.semaphore:
+            website = business.get("sitio_web")
+            updated = dict(business)
+
+            if not website or "google.com" in website:
+                await self.update_progress(False, False)
+                self.results_by_index[index] = updated
+                return updated
+
+            cached_site = self.site_cache.get(website)
+            if cached_site is not None:
+                all_emails, all_phones = cached_site
+                if all_emails and not updated.get("email"):
+                    updated["email"] = sorted(all_emails)[0]
+                if all_phones and not updated.get("telefono"):
+                    updated["telefono"] = all_phones[0]
+                await self.update_progress(bool(all_emails), bool(all_phones))
+                self.results_by_index[index] = updated
+                return updated
+
+            static_result = await self.try_static_extraction(website)
+            if static_result is not None:
+                all_emails, all_phones = static_result
+                self.site_cache[website] = (set(all_emails), all_phones)
+                if all_emails and not updated.get("email"):
+                    updated["email"] = sorted(all_emails)[0]
+                if all_phones and not updated.get("telefono"):
+                    updated["telefono"] = all_phones[0]
+                await self.update_progress(bool(all_emails), bool(all_phones))
+                self.results_by_index[index] = updated
+                return updated
+
+            context = await self.context_pool.get()
+            try:
+                # Las páginas de un mismo contexto son baratas y Chromium las
+                # sirve en paralelo; el lock por host protege al servidor del
+                # sitio también cuando varios negocios comparten dominio.
+                host_lock = self._host_locks[urlparse(website).netloc]
+
+                async def fetch_path(path):
+                    url = urljoin(website, path) if path else website
+                    async with host_lock:
+                        page = await context.new_page()
+                        try:
+                            return await self.extract_contacts_from_page(page, url)
+                        finally:
+                            await page.close()
+
+                all_emails = set()
+                all_phones = []
+
+                def collect(results):
+                    for result in results:
+                        if isinstance(result, BaseException):
+                            continue
+                        emails, phones = result
+                        all_emails.update(emails)
+                        for phone in phones:
+                            if phone not in all_phones:
+                                all_phones.append(phone)
+
+                # Primera oleada: /contacto y la portada. Si ya aparece un
+                # email válido, las rutas restantes no se rastrean.
+                priority_paths = self.contact_paths[:2]
+                collect(await asyncio.gather(
+                    *[fetch_path(path) for path in priority_paths],
+                    return_exceptions=True
+                ))
+
+                if not all_emails:
+                    collect(await asyncio.gather(
+                        *[fetch_path(path) for path in self.contact_paths[2:]],
+                        return_exceptions=True
+                    ))
+
+                self.site_cache[website] = (all_emails, all_phones)
+
+                if all_emails and not updated.get("email"):
+                    updated["email"] = sorted(all_emails)[0]
+                if all_phones and not updated.get("telefono"):
+                    updated["telefono"] = all_phones[0]
+
+                await self.update_progress(bool(all_emails), bool(all_phones))
+            except Exception:
+                await self.update_progress(False, False)
+            finally:
+                # El contexto vuelve al pool pase lo que pase: si se pierde
+                # uno, la concurrencia baja para siempre y los ficheros
+                # siguientes pueden bloquearse esperando en context_pool.get.
+                try:
+                    await context.clear_cookies()
+                except Exception:
+                    pass
+                await self.context_pool.put(context)
+
+            self.results_by_index[index] = updated
+            return updated
+
+
+    async def update_progress(self, found_email, found_phone):
+        # Todo corre en el hilo del event loop: los incrementos entre awaits
+        # no pueden intercalarse, así que no hace falta ningún lock.
+        self.processed_count += 1
+        if found_email:
+            self.emails_found += 1
+        if found_phone:
+            self.phones_found += 1
+        processed = self.processed_count
+
+        if processed % 10 == 0 or processed == self.total_count:
+            console.print(
+                f"[cyan][i][/cyan] Progreso: {processed}/{self.total_count} "
+                f"(emails: {self.emails_found}, teléfonos: {self.phones_found})"
+            )
+
+
+    async def process_single_file(self, json_file):
+        try:
+            with open(json_file, "rb") as f:
+                businesses = orjson.loads(f.read())
+
+            if not isinstance(businesses, list):
+                return False
+
+            self.results_by_index = [None] * len(businesses)
+            self.processed_count = 0
+            self.emails_found = 0
+            self.phones_found = 0
+            self.total_count = len(businesses)
+
+            # El email original se anota antes de lanzar las tareas: comparar
+            # después contra self.results_by_index es O(N) y no depende del
+            # orden en que terminen los workers.
+            had_email = [bool(b.get("email")) for b in businesses]
+
+            # self.semaphore ya acota la concurrencia real; las tareas pueden
+            # crearse todas de golpe y arrancan en cuanto haya hueco.
+            await asyncio.gather(
+                *[
+                    self.verify_business_contacts_worker(business, i)
+                    for i, business in enumerate(businesses)
+                ]
+            )
+
+            new_emails = sum(
+                1 for i, result in enumerate(self.results_by_index)
+                if result and result.get("email") and not had_email[i]
+            )
+
+            output_file = self.output_dir / f"{json_file.stem}_verificado.json"
+            with open(output_file, "wb") as f:
+                f.write(orjson.dumps(self.results_by_index, option=orjson.OPT_INDENT_2))
+
+            console.print(
+                f"[green][✓][/green] {json_file.name}: "
+                f"{new_emails} emails nuevos verificados"
+            )
+            console.print(f"[blue][i][/blue] Guardado en: {output_file.name}")
+            return True
+
+        except Exception as e:
+            console.print(f"[red][!][/red] Error procesando {json_file.name}: {e}")
+            return False
+
+
+    async def execute(self):
+        console.print("[bold blue][i] Iniciando verificación de contactos[/bold blue]")
+        console.print("=" * 50)
+
+        json_files = list(self.data_dir.glob("negocios_*.json"))
+
+        if not json_files:
+            console.print("[red][!][/red] No se encontraron archivos 'negocios_*.json'")
+            return
+
+        self.semaphore = asyncio.Semaphore(self.max_concurrent_workers)
+        await self.initialize_browsers()
+
+        try:
+            successful_files = 0
+            for json_file in json_files:
+                console.print(f"\n[bold cyan][i] Procesando: {json_file.name}[/bold cyan]")
+                if await self.process_single_file(json_file):
+                    successful_files += 1
+
+            console.print(
+                f"\n[bold green][✓] Archivos procesados: "
+                f"{successful_files}/{len(json_files)}[/bold green]"
+            )
+        finally:
+            await self.cleanup_browsers()
+
+
+def main():
+    verifier = ConcurrentContactVerifier()
+    asyncio.run(verifier.execute())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,62 +1,75 @@
-import json
-import requests
+import asyncio
 import re
-import time
-from datetime import datetime
 from pathlib import Path
-from bs4 import BeautifulSoup
+
+import httpx
+import orjson
 from rich.console import Console
 
+from contact_verifier import INVALID_EMAIL_EXTENSIONS_TUPLE
+
 console = Console()
 
+EMAIL_RE = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+MAILTO_RE = re.compile(r"href=[\"']mailto:([^\"'?]+)")
+
 
 class EmailExtractor:
-    def __init__(self):
+    def __init__(self, max_concurrent_requests=5):
         self.root = Path(__file__).parent
         self.data_dir = self.root / '../data'
         self.output_dir = self.data_dir / '../output'
         self.contact_paths = ["/contacto", "/contact", "/empresa", "/about", "/quienes-somos"]
+        self.max_concurrent_requests = max_concurrent_requests
+        self.headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
         self.data_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
 
 
-    def extract_email_from_web(self, url):
+    async def extract_email_from_web(self, client, url):
         try:
-            headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-            res = requests.get(url, headers=headers, timeout=10)
+            res = await client.get(url)
             if res.status_code != 200:
                 return None
-            
-            soup = BeautifulSoup(res.text, "html.parser")
-            emails = set(re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", soup.text))
-            
-            filtered_emails = [email for email in emails if not any(
-                spam in email.lower() for spam in ['noreply', 'no-reply', 'admin@', 'webmaster@']
-            )]
-            
+
+            # El regex sobre el HTML crudo encuentra lo mismo que sobre el
+            # texto parseado, y los mailto: cazan emails que no están visibles.
+            # A cambio también matchea assets (logo@2x.png, hero@3x.webp...),
+            # que se descartan con el mismo filtro de extensiones del verifier.
+            emails = set(EMAIL_RE.findall(res.text))
+            emails.update(MAILTO_RE.findall(res.text))
+
+            filtered_emails = [
+                email for email in emails
+                if not email.lower().endswith(INVALID_EMAIL_EXTENSIONS_TUPLE)
+                and not any(
+                    spam in email.lower() for spam in ['noreply', 'no-reply', 'admin@', 'webmaster@']
+                )
+            ]
+
             return filtered_emails[0] if filtered_emails else None
         except Exception:
             return None
 
 
-    def get_email(self, website):
+    async def get_email(self, client, website):
         if not website or "google.com" in website or "gmb" in website:
             return None
-        
-        email = self.extract_email_from_web(website)
+
+        email = await self.extract_email_from_web(client, website)
         if email:
             return email
-        
+
         for path in self.contact_paths:
             if website.endswith("/"):
                 url = website[:-1] + path
             else:
                 url = website + path
-            
-            email = self.extract_email_from_web(url)
+
+            email = await self.extract_email_from_web(client, url)
             if email:
                 return email
-        
+
         return None
 
 
@@ -66,38 +79,61 @@ class EmailExtractor:
         return re.match(r"[^@\s]+@[^@\s]+\.[a-zA-Z0-9]+$", email) is not None
 
 
+    async def _process_businesses(self, businesses):
+        # El semáforo acota las peticiones salientes (cortesía) sin
+        # serializar todo el lote como hacía el antiguo time.sleep(2).
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        limits = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+        async with httpx.AsyncClient(
+            http2=True,
+            limits=limits,
+            timeout=10,
+            headers=self.headers,
+            follow_redirects=True
+        ) as client:
+
+            async def process_one(i, business):
+                website = business.get("sitio_web")
+
+                if not website:
+                    business["email"] = None
+                    return 0
+
+                console.print(f"[cyan][i][/cyan] Procesando [{i}/{len(businesses)}]: {website}")
+
+                async with semaphore:
+                    email = await self.get_email(client, website)
+
+                if email and self.validate_email_format(email):
+                    business["email"] = email
+                    console.print(f"[green][✓][/green] Email encontrado: {email}")
+                    return 1
+
+                business["email"] = None
+                console.print(f"[yellow][!][/yellow] No se encontró email")
+                return 0
+
+            found = await asyncio.gather(
+                *[process_one(i, b) for i, b in enumerate(businesses, 1)]
+            )
+
+        return sum(found)
+
+
     def process_json_file(self, json_file):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                businesses = json.load(f)
-            
+            with open(json_file, 'rb') as f:
+                businesses = orjson.loads(f.read())
+
             if not isinstance(businesses, list):
                 return False
-            
-            emails_found = 0
-            
-            for i, business in enumerate(businesses, 1):
-                website = business.get("sitio_web")
-                
-                if website:
-                    console.print(f"[cyan][i][/cyan] Procesando [{i}/{len(businesses)}]: {website}")
-                    email = self.get_email(website)
-                    
-                    if email and self.validate_email_format(email):
-                        business["email"] = email
-                        emails_found += 1
-                        console.print(f"[green][✓][/green] Email encontrado: {email}")
-                    else:
-                        business["email"] = None
-                        console.print(f"[yellow][!][/yellow] No se encontró email")
-                    
-                    time.sleep(2)
-                else:
-                    business["email"] = None
-            
+
+            emails_found = asyncio.run(self._process_businesses(businesses))
+
             output_file = self.output_dir / json_file.name
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(businesses, f, ensure_ascii=False, indent=2)
+            with open(output_file, "wb") as f:
+                f.write(orjson.dumps(businesses, option=orjson.OPT_INDENT_2))
             
             console.print(f"[green][✓][/green] Emails encontrados: {emails_found}/{len(businesses)}")
             console.print(f"[blue][i][/blue] Guardado en: {output_file.name}")
@@ -1,91 +1,203 @@
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import List, Optional
 
-import os
-import requests
-from dotenv import load_dotenv
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import sync_playwright
 from rich.console import Console
 
-
 console = Console()
 rprint = console.print
 
 
-def test_api_key():
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
-    
-    rprint("[bold blue] Verificando API Key...[/bold blue]")
-    
-    if not api_key:
-        rprint("[red] ERROR: No se encontró GOOGLE_API_KEY en .env[/red]")
-        rprint("[yellow] Crea un archivo .env con: GOOGLE_API_KEY=tu_api_key[/yellow]")
-        return False
-    
-    rprint(f"[green] API Key encontrada: {api_key[:20]}...")
-    
-    test_url = "https://maps.googleapis.com/maps/api/geocode/json"
-    test_params = {
-        "address": "Madrid, España",
-        "key": api_key
+_ALLOWED_RESOURCE_TYPES = frozenset({"document", "xhr", "fetch", "script"})
+
+_LEADING_TRAILING = re.compile(r"^[^\w\s]+|[^\w\s]+$")
+_WS = re.compile(r"\s+")
+_STOP = re.compile(r"^(de|del|la|el|los|las|y|e)\s*$", re.I)
+
+# Extrae los títulos de los popups de Leaflet sin simular clics: recorre el
+# registro interno de capas del mapa (map._layers) y lee el contenido ya
+# vinculado con bindPopup/options.title, en una sola ida y vuelta al navegador.
+_EXTRACT_TITLES_JS = """
+() => {
+    const titles = [];
+    const titleRe = /<h4[^>]*class=["']?finddo-title["']?[^>]*>([^<]*)<\\/h4>/gi;
+
+    const maps = [];
+    for (const key of Object.keys(window)) {
+        const value = window[key];
+        if (value && value._layers && typeof value.getCenter === 'function') {
+            maps.push(value);
+        }
+    }
+
+    for (const map of maps) {
+        for (const layer of Object.values(map._layers)) {
+            if (layer.options && layer.options.title) {
+                titles.push(layer.options.title);
+            }
+            const popup = typeof layer.getPopup === 'function'
+                ? layer.getPopup()
+                : null;
+            const content = popup ? popup.getContent() : null;
+            if (typeof content === 'string') {
+                let match;
+                while ((match = titleRe.exec(content)) !== null) {
+                    titles.push(match[1]);
+                }
+            }
+        }
     }
-    
-    try:
-        rprint("[blue] Probando conexión con Google API...[/blue]")
-        response = requests.get(test_url, params=test_params)
-        data = response.json()
-        
-        status = data.get("status")
-        rprint(f"[cyan] Status de respuesta: {status}")
-        
-        if status == "OK":
-            rprint("[green] ¡API Key funciona correctamente![/green]")
-            result = data["results"][0]
-            location = result["geometry"]["location"]
-            rprint(f"[dim]Coordenadas de prueba: {location['lat']}, {location['lng']}[/dim]")
-            return True
-            
-        elif status == "REQUEST_DENIED":
-            rprint("[red] REQUEST_DENIED - Problemas con la API Key[/red]")
-            
-            error_message = data.get("error_message", "")
-            rprint(f"[red]Mensaje de error: {error_message}")
-            
-            rprint("[yellow] Posibles soluciones:")
-            rprint("1. Verificar que la API Key es correcta")
-            rprint("2. Habilitar Geocoding API en Google Cloud Console")
-            rprint("3. Verificar restricciones de la API Key")
-            rprint("4. Verificar facturación en Google Cloud")
-            
-            return False
-            
-        elif status == "OVER_QUERY_LIMIT":
-            rprint("[yellow] Límite de consultas excedido[/yellow]")
-            return False
-            
-    except Exception as e:
-        rprint(f"[red] Error de conexión: {str(e)}")
-        return False
-
-
-def show_setup_instructions():
-    rprint("\n[bold yellow] Instrucciones para obtener API Key:")
-    rprint("1. Ve a: https://console.cloud.google.com/")
-    rprint("2. Crea un proyecto nuevo o selecciona uno existente")
-    rprint("3. Habilita las APIs:")
-    rprint("   - Geocoding API")
-    rprint("   - Places API")
-    rprint("4. Ve a 'Credenciales' > 'Crear credenciales' > 'Clave de API'")
-    rprint("5. Copia la API Key y ponla en el archivo .env")
-    rprint("\n[bold cyan] Formato del archivo .env:")
-    rprint("GOOGLE_API_KEY=AIzaSyBxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
 
+    if (titles.length === 0) {
+        for (const marker of document.querySelectorAll('.leaflet-marker-icon')) {
+            if (marker.title) {
+                titles.push(marker.title);
+            }
+        }
+    }
+
+    return titles;
+}
+"""
+
+
+class PoligonScraper:
+
+    def __init__(self, url: str, headless: bool = True) -> None:
+        self.url = url
+        self.headless = headless
+        self.names: List[str] = []
+        self._seen: set[str] = set()
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+
+
+    def start_browser(self) -> None:
+        self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(headless=self.headless)
+        self.context = self.browser.new_context(
+            bypass_csp=True,
+            service_workers="block"
+        )
+        self.context.route("**/*", self._filter_request)
+        self.page = self.context.new_page()
+        self.page.set_extra_http_headers({"Accept-Encoding": "gzip"})
+
+
+    @staticmethod
+    def _filter_request(route) -> None:
+        if route.request.resource_type in _ALLOWED_RESOURCE_TYPES:
+            route.continue_()
+        else:
+            route.abort()
+
+
+    def stop_browser(self) -> None:
+        if self.browser:
+            self.browser.close()
+        if self.playwright:
+            self.playwright.stop()
+
+
+    def extract_names_using_javascript(self) -> List[str]:
+        """
+        Extrae los nombres de los marcadores del mapa en una sola pasada
+
+        Returns:
+            Lista de títulos en bruto encontrados en los popups
+        """
+        try:
+            self.page.wait_for_function(
+                "() => document.querySelectorAll('.leaflet-marker-icon').length > 100",
+                timeout=15000
+            )
+        except PlaywrightTimeoutError:
+            self.page.wait_for_load_state("networkidle")
+
+        rprint("[blue]Extrayendo nombres del registro de marcadores...[/blue]")
+        titles = self.page.evaluate(_EXTRACT_TITLES_JS)
+        rprint(f"[green]{len(titles)} títulos extraídos[/green]")
+        return titles
+
+
+    def clean_polygon_name(self, name: str) -> Optional[str]:
+        if not name:
+            return None
+
+        cleaned = _LEADING_TRAILING.sub("", name.strip())
+        cleaned = _WS.sub(" ", cleaned).strip()
+
+        if not cleaned or _STOP.match(cleaned):
+            return None
+
+        return cleaned
+
+
+    def run(self) -> List[str]:
+        """
+        Escanea el mapa y devuelve los nombres de polígonos encontrados
+
+        Returns:
+            Lista de nombres únicos y limpios
+        """
+        rprint(f"[bold blue]Cargando mapa:[/bold blue] {self.url}")
+
+        try:
+            self.start_browser()
+            self.page.goto(self.url, wait_until="domcontentloaded")
+
+            raw_names = self.extract_names_using_javascript()
+
+            for raw_name in raw_names:
+                cleaned_name = self.clean_polygon_name(raw_name)
+                if cleaned_name and cleaned_name not in self._seen:
+                    self._seen.add(cleaned_name)
+                    self.names.append(cleaned_name)
+
+            rprint(f"[green]✓ {len(self.names)} nombres únicos encontrados[/green]")
+            return self.names
+
+        finally:
+            self.stop_browser()
+
+
+    def save_to_json(self, filename: str = "./data/poligonos_madrid.json") -> None:
+        output_path = Path(filename)
+        output_path.parent.mkdir(exist_ok=True)
+
+        payload = {
+            "total_names": len(self.names),
+            "names": sorted(self.names)
+        }
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+
+        rprint(f"[green]✓ Nombres guardados en {filename}[/green]")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scraper de nombres de polígonos industriales"
+    )
+    parser.add_argument("--url", type=str, required=True, help="URL del mapa")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="./data/poligonos_madrid.json",
+        help="Archivo JSON de salida"
+    )
+    args = parser.parse_args()
+
+    scraper = PoligonScraper(args.url)
+    scraper.run()
+    scraper.save_to_json(args.output)
 
 
 if __name__ == "__main__":
-    rprint("[bold green] Test de API Key de Google")
-    
-    success = test_api_key()
-    
-    if not success:
-        show_setup_instructions()
-    
-    rprint(f"\n[bold]Resultado: {' ÉXITO' if success else ' FALLO'}")
\ No newline at end of file
+    main()